@@ -1,4 +1,8 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine, Session, text
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -7,26 +11,223 @@ DB_PATH = BASE_DIR / "database" / "earthquakes.db"
 # SQLite connection string with foreign key support
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-# Create engine with connection arguments for SQLite
+# Create engine with connection arguments for SQLite.
+# isolation_level=None turns off the sqlite3 driver's implicit BEGIN/COMMIT
+# handling; transactions are started explicitly by _begin_transaction below.
+# The engine is created once at import and keeps a pool of open connections,
+# so request handlers never pay for opening the file and reading the schema.
+POOL_SIZE = 20
+MAX_OVERFLOW = 10
+
 engine = create_engine(
     DATABASE_URL,
     echo=False,  # Set to True for SQL query logging
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False, "isolation_level": None},
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    # Hand out the most recently returned connection first, so a few warm
+    # connections do the work and idle overflow ones are retired.
+    pool_use_lifo=True,
+    pool_recycle=1800,
+    query_cache_size=1200,  # compiled-statement cache shared by all queries
+)
+
+# Applied to every new DBAPI connection. WAL + synchronous=NORMAL avoids an
+# fsync on every commit while staying crash-safe, and lets readers run while
+# fetch_data writes. Reads go through a memory map instead of read() calls.
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+    "PRAGMA cache_size = -200000",  # negative = KiB, i.e. ~200 MB
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in CONNECTION_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+@event.listens_for(engine, "begin")
+def _begin_transaction(connection):
+    # Connections can opt into e.g. "BEGIN IMMEDIATE" via the sqlite_begin
+    # execution option (see bulk_load_session).
+    connection.exec_driver_sql(connection.get_execution_options().get("sqlite_begin", "BEGIN"))
+
+
+# Development-only N+1 guard: with EARTHQUAKE_API_DEBUG=1 every statement the
+# engine runs is counted against the request it belongs to, and main.py fails
+# requests that run more than MAX_STATEMENTS_PER_REQUEST (BEGIN included).
+DEBUG = os.getenv("EARTHQUAKE_API_DEBUG") == "1"
+MAX_STATEMENTS_PER_REQUEST = 10
+
+_statement_counter: ContextVar = ContextVar("statement_counter", default=None)
+
+if DEBUG:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        counter = _statement_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+@contextmanager
+def count_statements():
+    """
+    Count the statements executed inside the block (only while DEBUG is on).
+    Yields a one-item list holding the running count; it is mutable so
+    worker threads, which see a copy of the context, update the same counter.
+    """
+    counter = [0]
+    token = _statement_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _statement_counter.reset(token)
+
+
+# Stored in PRAGMA user_version. Bump it whenever the schema changes so
+# init_db() knows to run create_all() again.
+SCHEMA_VERSION = 11
+
+# Indexes created by earlier versions that nothing queries any more. Sorting
+# and range filters moved from the TEXT datetime column to time_ms, and the
+# single-column magnitude / region_id indexes are prefixes of the composite
+# ones declared in models.py.
+RETIRED_INDEXES = (
+    "ix_Earthquake_datetime",
+    "ix_Earthquake_magnitude_datetime",
+    "ix_Earthquake_region_datetime",
+    "ix_Earthquake_magnitude",
+    "ix_Earthquake_region_id",
+)
+
+# R-Tree over each quake's (lat, lon) point, kept in step with Earthquake by
+# triggers. SQLAlchemy cannot declare virtual tables, so it is raw DDL.
+SPATIAL_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS earthquake_rtree "
+    "USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    """
+    CREATE TRIGGER IF NOT EXISTS earthquake_rtree_insert AFTER INSERT ON "Earthquake"
+    BEGIN
+        INSERT INTO earthquake_rtree
+        VALUES (new.quake_id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS earthquake_rtree_update
+    AFTER UPDATE OF quake_id, latitude, longitude ON "Earthquake"
+    BEGIN
+        DELETE FROM earthquake_rtree WHERE id = old.quake_id;
+        INSERT INTO earthquake_rtree
+        VALUES (new.quake_id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS earthquake_rtree_delete AFTER DELETE ON "Earthquake"
+    BEGIN
+        DELETE FROM earthquake_rtree WHERE id = old.quake_id;
+    END
+    """,
+    # Index rows that were loaded before the triggers existed
+    """
+    INSERT INTO earthquake_rtree
+    SELECT quake_id, latitude, latitude, longitude, longitude FROM "Earthquake"
+    WHERE quake_id NOT IN (SELECT id FROM earthquake_rtree)
+    """,
+)
+
+# Keeps RegionQuakeCount equal to COUNT(*) ... GROUP BY region_id so the
+# per-region endpoints read one row per region instead of aggregating.
+REGION_COUNT_DDL = (
+    """
+    CREATE TRIGGER IF NOT EXISTS region_count_insert AFTER INSERT ON "Earthquake"
+    BEGIN
+        INSERT INTO "RegionQuakeCount" (region_id, quake_count) VALUES (new.region_id, 1)
+        ON CONFLICT (region_id) DO UPDATE SET quake_count = quake_count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS region_count_update AFTER UPDATE OF region_id ON "Earthquake"
+    BEGIN
+        UPDATE "RegionQuakeCount" SET quake_count = quake_count - 1 WHERE region_id = old.region_id;
+        INSERT INTO "RegionQuakeCount" (region_id, quake_count) VALUES (new.region_id, 1)
+        ON CONFLICT (region_id) DO UPDATE SET quake_count = quake_count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS region_count_delete AFTER DELETE ON "Earthquake"
+    BEGIN
+        UPDATE "RegionQuakeCount" SET quake_count = quake_count - 1 WHERE region_id = old.region_id;
+    END
+    """,
+    # Recount from scratch so files migrated from an older version start exact
+    'DELETE FROM "RegionQuakeCount"',
+    """
+    INSERT INTO "RegionQuakeCount" (region_id, quake_count)
+    SELECT region_id, COUNT(*) FROM "Earthquake" GROUP BY region_id
+    """,
 )
 
 
+def _migrate_columns(connection):
+    """Add columns introduced after the first release to an existing file."""
+    columns = {row[1] for row in connection.exec_driver_sql('PRAGMA table_info("Earthquake")')}
+    if "time_ms" not in columns:
+        connection.exec_driver_sql('ALTER TABLE "Earthquake" ADD COLUMN time_ms INTEGER')
+    # Backfill from the text timestamp (second precision) for older rows
+    connection.exec_driver_sql(
+        "UPDATE \"Earthquake\" SET time_ms = CAST(strftime('%s', datetime) AS INTEGER) * 1000 "
+        "WHERE time_ms IS NULL"
+    )
+
+
 def init_db():
     """
     Initialize the database by creating all tables.
-    Call this once when setting up the database.
+    Call this once when setting up the database. It is a no-op (one PRAGMA
+    read) when the file is already at SCHEMA_VERSION.
     """
+    from . import models  # noqa: F401  (registers the tables on SQLModel.metadata)
+
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    SQLModel.metadata.create_all(engine)
-    
-    # Enable foreign keys for SQLite
-    with Session(engine) as session:
-        session.exec(text("PRAGMA foreign_keys = ON;"))
-        session.commit()
+    with engine.connect() as connection:
+        version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+        if version >= SCHEMA_VERSION:
+            return
+
+        SQLModel.metadata.create_all(connection)
+        _migrate_columns(connection)
+        for name in RETIRED_INDEXES:
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+        # create_all() skips existing tables entirely, so indexes added to a
+        # model later have to be created separately on older files.
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        for statement in SPATIAL_INDEX_DDL + REGION_COUNT_DDL:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.commit()
+
+
+def optimize_db():
+    """
+    Run SQLite's PRAGMA optimize, which re-ANALYZEs only the tables whose
+    statistics look stale so the planner keeps choosing the right indexes.
+    analysis_limit caps how many rows each index is sampled for, so this
+    stays a few milliseconds even on a large file.
+    """
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA analysis_limit = 400")
+        connection.exec_driver_sql("PRAGMA optimize")
 
 
 def get_session():
@@ -35,4 +236,43 @@ def get_session():
     Use with FastAPI's Depends() for automatic session management.
     """
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+@contextmanager
+def bulk_load_session():
+    """
+    Yield a session for one-shot bulk loads (e.g. fetch_data.py).
+    Everything up to session.commit() runs in a single BEGIN IMMEDIATE
+    transaction. Durability is relaxed and foreign keys are not enforced
+    while the session is open (call check_foreign_keys() before
+    committing); the normal connection PRAGMAs are restored afterwards,
+    even if the load fails. The file stays in WAL mode, so the API can keep
+    reading while the load runs.
+    """
+    with engine.connect() as connection:
+        connection.execution_options(sqlite_begin="BEGIN IMMEDIATE")
+        dbapi_connection = connection.connection.driver_connection
+        try:
+            dbapi_connection.execute("PRAGMA foreign_keys = OFF")
+            dbapi_connection.execute("PRAGMA synchronous = OFF")
+            with Session(bind=connection) as session:
+                yield session
+        finally:
+            dbapi_connection.execute("PRAGMA synchronous = NORMAL")
+            dbapi_connection.execute("PRAGMA foreign_keys = ON")
+
+
+def check_foreign_keys(session: Session, table: str = "Earthquake"):
+    """
+    Raise if any row of table references a missing parent row. The default,
+    Earthquake, is the table loads insert into (the trigger-maintained
+    RegionQuakeCount only holds region_ids taken from it). Every row of the
+    table is checked, not just the ones this transaction wrote. Use before
+    committing a bulk_load_session().
+    """
+    violations = session.exec(text(f'PRAGMA foreign_key_check("{table}")')).all()
+    if violations:
+        raise RuntimeError(
+            f"{len(violations)} rows violate foreign key constraints, first: {tuple(violations[0])}"
+        )
\ No newline at end of file
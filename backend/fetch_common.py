@@ -0,0 +1,237 @@
+# USGS download + transform steps shared by the database loaders:
+# fetching GeoJSON pages, region/zone classification and the lookup-table
+# seed rows. Nothing in here touches the database.
+import numpy as np
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timezone
+
+
+BASE_URL = "https://earthquake.usgs.gov/fdsnws/event/1/query"
+PAGE_SIZE = 50
+# Ask for gzip explicitly so large pages are always compressed on the wire
+HEADERS = {"Accept-Encoding": "gzip", "User-Agent": "IEE305-Quake/1.0"}
+
+
+def build_params() -> dict:
+    """
+    Filter window parameters for the USGS query. Built per call so a
+    long-running process never queries with a stale 'endtime'.
+    """
+    return {
+        "format": "geojson",
+        "starttime": "2025-01-01",
+        "endtime": datetime.now(timezone.utc).date().isoformat(),
+        "minmagnitude": 3,
+        "orderby": "time",
+        "limit": PAGE_SIZE,
+    }
+
+
+# classifiers for region_id and zone_id
+
+# Bounding-box tables, one row per box: (lat_lo, lat_hi, lon_lo, lon_hi, id).
+# Earlier rows take priority; points outside every box get the default id.
+# Adding a region or zone only needs a new row here.
+REGION_BOXES = (
+    (30.0, 42.0, -130.0, -110.0, 1),     # California
+    (50.0, 72.0, -180.0, -130.0, 2),     # Alaska (incl. Aleutians)
+    (30.0, 65.0, 135.0, 170.0, 3),       # Japan + Kuril + Kamchatka + Russian Pacific margin
+    (-60.0, -15.0, -80.0, -65.0, 4),     # Chile
+    (-15.0, 15.0, 95.0, 155.0, 5),       # Indonesia / Philippines / PNG
+    (-60.0, -10.0, 155.0, 180.0, 6),     # New Zealand + SW Pacific (Fiji / Tonga / Kermadec)
+    (-60.0, -10.0, -180.0, -160.0, 6),   # ... same region across the antimeridian
+    (30.0, 46.0, -10.0, 40.0, 7),        # Mediterranean
+    (20.0, 45.0, 60.0, 115.0, 8),        # Himalayas / central Asia collision belt (incl. much of China)
+    (15.0, 22.0, -72.0, -60.0, 9),       # Caribbean Arc (Puerto Rico / USVI)
+)
+DEFAULT_REGION_ID = 10                   # Everything else
+
+ZONE_BOXES = (
+    (30.0, 72.5, -150.0, -110.0, 1),     # US Pacific Subduction Margin (California + Alaska coast)
+    (30.0, 50.0, 130.0, 160.0, 2),       # Japan Trench Zone
+    (-60.0, 5.0, -90.0, -60.0, 3),       # Andean Subduction (Chile–Peru)
+    (-15.0, 10.0, 90.0, 150.0, 4),       # Sunda Arc (Indonesia)
+    (-50.0, -30.0, 160.0, 180.0, 5),     # New Zealand Plate Boundary
+    (25.0, 50.0, -10.0, 40.0, 6),        # Mediterranean Collision/Subduction
+    (20.0, 40.0, 70.0, 100.0, 7),        # Himalayan Collision Belt
+    (-60.0, 60.0, -40.0, -10.0, 8),      # Mid-Atlantic Ridge
+    (15.0, 22.0, -70.0, -60.0, 9),       # Caribbean Subduction Zone (Puerto Rico Trench)
+)
+DEFAULT_ZONE_ID = 10                     # Other Oceanic / Miscellaneous
+
+_REGION_BOX_ARRAY = np.array(REGION_BOXES)
+_ZONE_BOX_ARRAY = np.array(ZONE_BOXES)
+
+
+def _classify_boxes(lats: np.ndarray, lons: np.ndarray, boxes: np.ndarray, default: int) -> np.ndarray:
+    # Test every point against every box at once: an (N, K) hit matrix with
+    # no per-box branching. argmax returns the first True column, i.e. the
+    # first matching box, so earlier rows keep their priority.
+    lat = lats[:, None]
+    lon = lons[:, None]
+    hits = (lat >= boxes[:, 0]) & (lat <= boxes[:, 1]) & (lon >= boxes[:, 2]) & (lon <= boxes[:, 3])
+    ids = boxes[:, 4].astype(np.int64)[hits.argmax(axis=1)]
+    return np.where(hits.any(axis=1), ids, default)
+
+
+def classify_regions(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Map arrays of latitude/longitude to coarse geographic region_ids.
+    Uses real-world bounding boxes based on country/region extents.
+    """
+    # Normalize longitude to [-180, 180]
+    lons = np.where(lons > 180, lons - 360, lons)
+    return _classify_boxes(lats, lons, _REGION_BOX_ARRAY, DEFAULT_REGION_ID)
+
+
+def classify_zones(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Map arrays of latitude/longitude to tectonic seismic zone_ids.
+    Zones are bigger belts (subduction margins, ridges, collision zones).
+    """
+    return _classify_boxes(lats, lons, _ZONE_BOX_ARRAY, DEFAULT_ZONE_ID)
+
+
+def classify_batch(lats: np.ndarray, lons: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Classify a whole batch of points in one call.
+    Returns (region_ids, zone_ids) as int64 arrays aligned with the inputs.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    return classify_regions(lats, lons), classify_zones(lats, lons)
+
+
+def features_to_columns(features: list) -> dict:
+    """
+    Transpose USGS GeoJSON features into parallel NumPy arrays
+    (time_ms, mag, depth_km, lat, lon) plus a list of places.
+    Features missing a magnitude, time or full coordinates are dropped.
+    """
+    numeric = []
+    places = []
+    for feature in features:
+        # Direct indexing; a missing or null properties/geometry/coordinates
+        # member surfaces as KeyError/TypeError, short coordinates as ValueError.
+        try:
+            props = feature["properties"]
+            lon, lat, depth_km = feature["geometry"]["coordinates"][:3]
+            numeric.append((props["time"], props["mag"], depth_km, lat, lon))
+        except (KeyError, TypeError, ValueError):
+            continue
+        places.append(props.get("place") or "Unknown location")
+
+    # None becomes NaN in a float64 array, so one mask catches every null
+    values = np.array(numeric, dtype=np.float64).reshape(-1, 5)
+    valid = ~np.isnan(values).any(axis=1)
+    values = values[valid]
+
+    return {
+        "time_ms": values[:, 0].astype(np.int64),
+        "mag": values[:, 1],
+        "depth_km": values[:, 2],
+        "lat": values[:, 3],
+        "lon": values[:, 4],
+        "place": [place for place, ok in zip(places, valid.tolist()) if ok],
+    }
+
+
+def columns_to_rows(columns: dict) -> list:
+    """
+    Classify and format the output of features_to_columns() column-wise,
+    then zip it into Earthquake row dicts for a single executemany.
+    """
+    if len(columns["time_ms"]) == 0:
+        # np.char.* cannot size an empty output array
+        return []
+
+    region_ids, zone_ids = classify_batch(columns["lat"], columns["lon"])
+
+    # Epoch ms -> 'YYYY-MM-DD HH:MM:SS' (UTC) for the whole column at once
+    dt_strs = np.char.replace(
+        np.datetime_as_string(columns["time_ms"].astype("datetime64[ms]"), unit="s"),
+        "T", " ",
+    )
+    places = np.char.replace(np.array(columns["place"], dtype=str), ",", " - ")
+
+    rows = []
+    for dt_str, time_ms, mag, depth_km, lat, lon, place, region_id, zone_id in zip(
+        dt_strs.tolist(),
+        columns["time_ms"].tolist(),
+        columns["mag"].tolist(),
+        columns["depth_km"].tolist(),
+        columns["lat"].tolist(),
+        columns["lon"].tolist(),
+        places.tolist(),
+        region_ids.tolist(),
+        zone_ids.tolist(),
+    ):
+        rows.append({
+            "datetime": dt_str,
+            "time_ms": time_ms,
+            "magnitude": mag,
+            "depth_km": depth_km,
+            "latitude": lat,
+            "longitude": lon,
+            "place": place,
+            "region_id": region_id,
+            "zone_id": zone_id,
+        })
+
+    return rows
+
+
+def fetch_features(max_pages: int = 1) -> list:
+    """
+    Download up to max_pages pages of PAGE_SIZE earthquakes from USGS.
+    All pages reuse one keep-alive HTTPS connection.
+    """
+    params = build_params()
+    features = []
+    with requests.Session() as http:
+        http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        http.headers.update(HEADERS)
+
+        for page in range(max_pages):
+            # USGS offsets are 1-based
+            offset = 1 + page * PAGE_SIZE
+            response = http.get(BASE_URL, params={**params, "offset": offset}, timeout=30)
+            response.raise_for_status()
+            # orjson parses the (already gunzipped) body bytes directly
+            batch = orjson.loads(response.content).get("features", [])
+
+            features.extend(batch)
+            if len(batch) < PAGE_SIZE:
+                break
+
+    return features
+
+
+# Seed rows for the Region and SeismicZone lookup tables
+REGION_SEED = [
+    dict(region_id=1, region_name="California Margin", country="USA", population=39_200_000),
+    dict(region_id=2, region_name="Alaska/Aleutian Margin", country="USA", population=733_000),
+    dict(region_id=3, region_name="NW Pacific Margin (Japan/Russia)", country="Japan + Russian Far East", population=125_700_000 + 6_300_000),
+    dict(region_id=4, region_name="Chile Subduction Zone", country="Chile", population=19_600_000),
+    dict(region_id=5, region_name="Indonesia/Philippines/PNG Arc", country="Indonesia + Philippines + PNG", population=277_500_000 + 117_300_000 + 9_700_000),
+    dict(region_id=6, region_name="New Zealand & SW Pacific", country="NZ + Fiji + Tonga + Samoa", population=5_200_000 + 940_000 + 107_000 + 225_000),
+    dict(region_id=7, region_name="Mediterranean Region", country="Turkey + Greece + Italy + Balkans", population=85_000_000 + 10_300_000 + 58_900_000 + 18_000_000),
+    dict(region_id=8, region_name="Himalaya/Central Asia Belt", country="India North + Nepal + Pakistan North + China West", population=600_000_000 + 30_300_000 + 70_000_000 + 95_000_000),
+    dict(region_id=9, region_name="Caribbean Arc (Puerto Rico / USVI)", country="Multiple", population=12_000_000),
+    dict(region_id=10, region_name="Other", country="Various", population=None),
+]
+
+ZONE_SEED = [
+    dict(zone_id=1, zone_name='US Pacific Subduction Margin', risk_level=5),
+    dict(zone_id=2, zone_name='Japan Trench Zone', risk_level=5),
+    dict(zone_id=3, zone_name='Andean Subduction Zone', risk_level=5),
+    dict(zone_id=4, zone_name='Sunda Arc (Indonesia)', risk_level=5),
+    dict(zone_id=5, zone_name='New Zealand Plate Boundary', risk_level=4),
+    dict(zone_id=6, zone_name='Mediterranean Collision/Subduction', risk_level=4),
+    dict(zone_id=7, zone_name='Himalayan Collision Belt', risk_level=4),
+    dict(zone_id=8, zone_name='Mid-Atlantic Ridge', risk_level=3),
+    dict(zone_id=9, zone_name='Caribbean Subduction Zone (Puerto Rico Trench)', risk_level=4),
+    dict(zone_id=10, zone_name='Other Oceanic Zone', risk_level=2),
+]
@@ -1,10 +1,31 @@
-from typing import List
-from fastapi import FastAPI, Query, HTTPException
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import date
+from functools import wraps
+from typing import List, Optional
+import orjson
+import pyarrow as pa
+from anyio import Semaphore, to_thread
+from cachetools.func import ttl_cache
+from fastapi import Depends, FastAPI, Query, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from .database import (
+    DEBUG,
+    MAX_OVERFLOW,
+    MAX_STATEMENTS_PER_REQUEST,
+    POOL_SIZE,
+    count_statements,
+    init_db,
+    optimize_db,
+)
 from .queries import (
+    MULTI_CRITERIA_COLUMNS,
     get_quakes_in_region,
     get_avg_magnitude_in_region,
     count_quakes_near_location,
+    radius_to_deltas,
     get_most_active_regions,
     get_high_magnitude_quakes,
     get_regions_with_min_quakes,
@@ -12,6 +33,10 @@ from .queries import (
     get_multi_criteria_quakes,
     get_quakes_in_high_population_regions,
     get_region_risk_summary,
+    get_region_full,
+    get_dashboard,
+    iter_quakes_in_region,
+    iter_multi_criteria_quakes,
 )
 
 from .schemas import (
@@ -19,13 +44,125 @@ from .schemas import (
     AvgMagnitudeResponse,
     NearbyCountResponse,
     RegionRiskSummary,
+    RegionFullResponse,
+    DashboardResponse,
 )
 
 
+def dump_json(payload) -> bytes:
+    # Row mappings are encoded via dict(). Their keys can be str subclasses,
+    # hence OPT_NON_STR_KEYS (the same option ORJSONResponse uses).
+    return orjson.dumps(payload, default=dict, option=orjson.OPT_NON_STR_KEYS)
+
+
+def encode_arrow(rows) -> bytes:
+    """
+    Encode rows as one Arrow IPC stream. Clients read it straight into a
+    columnar table instead of parsing JSON objects row by row.
+    """
+    table = pa.Table.from_pylist([dict(row) for row in rows])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+# Short-lived in-process cache for the global analytics endpoints. Their
+# parameter space is small and the data only changes when fetch_data runs,
+# so repeat requests within the TTL skip the database entirely.
+ANALYTICS_CACHE_TTL = 60  # seconds
+
+
+def _cached_response(func, encode, media_type):
+    # A fresh ttl_cache per endpoint, so handlers never share cache keys. The
+    # cache holds the encoded body, so a hit skips both the query and
+    # response serialization.
+    @ttl_cache(maxsize=128, ttl=ANALYTICS_CACHE_TTL)
+    def encoded(*args, **kwargs):
+        return encode(func(*args, **kwargs))
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return Response(content=encoded(*args, **kwargs), media_type=media_type)
+
+    return wrapper
+
+
+def analytics_cache(func):
+    """Cache an endpoint's JSON body for ANALYTICS_CACHE_TTL seconds."""
+    return _cached_response(func, dump_json, "application/json")
+
+
+def arrow_analytics_cache(func):
+    """Like analytics_cache, for endpoints that return rows as Arrow IPC."""
+    return _cached_response(func, encode_arrow, ARROW_STREAM_MEDIA_TYPE)
+
+
+# A streamed response keeps its pooled connection checked out until the last
+# batch is sent, long after the handler has returned its thread-limiter token.
+# Streams get their own slots, and the limiter set in lifespan is sized to the
+# rest of the pool, so the two together never ask for more than
+# POOL_SIZE + MAX_OVERFLOW connections.
+STREAM_SLOTS = 5
+stream_slots = Semaphore(STREAM_SLOTS)
+
+
+def ndjson_response(batches):
+    """Stream row batches to the client as newline-delimited JSON."""
+    def encode():
+        for batch in batches:
+            yield b"".join(dump_json(row) + b"\n" for row in batch)
+
+    async def body():
+        # Wait for a slot on the event loop, not in a worker thread, so
+        # queued streams cannot starve the threadpool that running streams
+        # need to make progress. The connection is only checked out once the
+        # first batch is pulled, i.e. after the slot is held.
+        async with stream_slots:
+            rows = encode()
+            try:
+                async for chunk in iterate_in_threadpool(rows):
+                    yield chunk
+            finally:
+                # Release the connection even if the client disconnects
+                # mid-stream.
+                await to_thread.run_sync(rows.close)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def arrow_response(rows):
+    """Return rows as an Arrow IPC stream response."""
+    return Response(content=encode_arrow(rows), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bring an existing earthquakes.db up to the current schema (indexes etc.)
+    init_db()
+    # The handlers are sync and run in Starlette's threadpool (40 threads by
+    # default). Cap it at the pooled connections not reserved for streaming
+    # (see STREAM_SLOTS) so extra requests wait on the event loop instead of
+    # parking threads on a pool checkout that can time out under load.
+    to_thread.current_default_thread_limiter().total_tokens = (
+        POOL_SIZE + MAX_OVERFLOW - STREAM_SLOTS
+    )
+    # Refresh planner statistics at startup and again on shutdown, as SQLite
+    # recommends for long-lived connections.
+    optimize_db()
+    yield
+    optimize_db()
+
+
 app = FastAPI(
     title="Earthquake Analytics API",
     description="Backend for IEE 305 Term Project",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -36,6 +173,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if DEBUG:
+    @app.middleware("http")
+    async def limit_statements_per_request(request, call_next):
+        # Catches N+1 regressions in development. Statements a StreamingResponse
+        # runs after the headers are sent are not counted.
+        with count_statements() as counter:
+            response = await call_next(request)
+        assert counter[0] <= MAX_STATEMENTS_PER_REQUEST, (
+            f"{request.url.path} ran {counter[0]} SQL statements "
+            f"(limit {MAX_STATEMENTS_PER_REQUEST}); is something lazy-loading?"
+        )
+        return response
+
+
 @app.get("/")
 def root():
     return {"message": "Earthquake Analytics API is running."}
@@ -44,18 +195,34 @@ def root():
 # -----------------------
 # Query 1 – Quakes in region
 # -----------------------
+def check_region_cursor(cursor_ms, cursor_id):
+    """Reject a keyset cursor that gives only one of its two halves."""
+    if (cursor_ms is None) != (cursor_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="cursor_ms and cursor_id must be given together.",
+        )
+
+
 @app.get(
     "/regions/{region_id}/earthquakes",
     response_model=List[EarthquakeInRegion],
     tags=["Regions"],
 )
-def api_quakes_in_region(region_id: int):
+def api_quakes_in_region(
+    region_id: int,
+    limit: int = Query(100, ge=1, le=1000, description="Page size"),
+    offset: int = Query(0, ge=0, description="Rows to skip (prefer the cursor)"),
+    cursor_ms: Optional[int] = Query(None, description="time_ms of the previous page's last row"),
+    cursor_id: Optional[int] = Query(None, description="quake_id of the previous page's last row"),
+):
     """
-    Returns all earthquakes for a given region.
-    Uses a typed response model (EarthquakeInRegion) and returns 404 if there
-    are no earthquakes for the given region.
+    Returns one page of earthquakes for a given region, newest first.
+    Uses a typed response model (EarthquakeInRegion) and returns 404 if the
+    page is empty.
     """
-    data = get_quakes_in_region(region_id)
+    check_region_cursor(cursor_ms, cursor_id)
+    data = get_quakes_in_region(region_id, limit, offset, cursor_ms, cursor_id)
 
     if not data:
         raise HTTPException(
@@ -66,6 +233,32 @@ def api_quakes_in_region(region_id: int):
     return data
 
 
+@app.get("/regions/{region_id}/earthquakes/stream", tags=["Regions"])
+def api_quakes_in_region_stream(region_id: int):
+    """
+    All of a region's earthquakes (unpaginated), streamed as NDJSON (one
+    object per line) so large regions are never held in memory at once.
+    An unknown region gives an empty body rather than a 404.
+    """
+    return ndjson_response(iter_quakes_in_region(region_id))
+
+
+@app.get("/regions/{region_id}/earthquakes/arrow", tags=["Regions"])
+def api_quakes_in_region_arrow(
+    region_id: int,
+    limit: int = Query(100, ge=1, le=1000, description="Page size"),
+    offset: int = Query(0, ge=0, description="Rows to skip (prefer the cursor)"),
+    cursor_ms: Optional[int] = Query(None, description="time_ms of the previous page's last row"),
+    cursor_id: Optional[int] = Query(None, description="quake_id of the previous page's last row"),
+):
+    """
+    Same page as /regions/{region_id}/earthquakes as an Arrow IPC stream.
+    An empty page gives a table with no rows rather than a 404.
+    """
+    check_region_cursor(cursor_ms, cursor_id)
+    return arrow_response(get_quakes_in_region(region_id, limit, offset, cursor_ms, cursor_id))
+
+
 # -----------------------
 # Query 2 – Average magnitude in region
 # -----------------------
@@ -79,17 +272,14 @@ def api_avg_magnitude(region_id: int):
     Returns average magnitude for earthquakes in a region.
     Returns 404 if the region has no earthquakes.
     """
-    results = get_avg_magnitude_in_region(region_id)
+    result = get_avg_magnitude_in_region(region_id)
 
-    if not results:
+    if result is None:
         raise HTTPException(
             status_code=404,
             detail=f"No earthquakes found to compute average for region_id={region_id}.",
         )
 
-    result = get_avg_magnitude_in_region(region_id)
-    if result is None:
-        ...
     return result
 
 
@@ -102,25 +292,22 @@ def api_avg_magnitude(region_id: int):
     tags=["Analytics"],
 )
 def api_quakes_near_location(
-    lat: float = Query(..., description="Latitude of the location."),
-    lon: float = Query(..., description="Longitude of the location."),
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the location."),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude of the location."),
     radius_km: float = Query(..., ge=0, description="Search radius in kilometers."),
 ):
     """
-    Count earthquakes within a bounding box around the given lat/lon.
+    Count earthquakes within the bounding box of a radius_km circle around
+    the given lat/lon.
     """
-    results = count_quakes_near_location(lat, lon, radius_km)
-
-    # Expecting a list with a single dict like {"quake_count": <int>}
-    if not results:
-        return {"quake_count": 0}
-
-    return results[0]
+    lat_delta, lon_delta = radius_to_deltas(lat, radius_km)
+    return count_quakes_near_location(lat, lon, lat_delta, lon_delta)
 
 # -----------------------
 # Query 4 – Most active regions
 # -----------------------
 @app.get("/analytics/regions/most-active")
+@analytics_cache
 def api_most_active_regions(
     top_n: int = Query(5, ge=1, le=10, description="Number of regions to return"),
 ):
@@ -133,22 +320,44 @@ def api_most_active_regions(
 # -----------------------
 # Query 5 – High magnitude earthquakes
 # -----------------------
+@dataclass(frozen=True)
+class HighMagnitudeParams:
+    """Query parameters shared by both high-magnitude routes (hashable, so
+    the analytics caches can key on it)."""
+    min_magnitude: float = Query(6.0, description="Minimum magnitude to include")
+    start_date: date = Query(..., description="Start date (YYYY-MM-DD)")
+    end_date: date = Query(..., description="End date (YYYY-MM-DD)")
+    limit: int = Query(50, ge=1, le=500, description="Max number of records")
+
+
+def _high_magnitude_rows(params: HighMagnitudeParams):
+    return get_high_magnitude_quakes(
+        params.min_magnitude, params.start_date, params.end_date, params.limit
+    )
+
+
 @app.get("/analytics/high-magnitude")
-def api_high_magnitude_quakes(
-    min_magnitude: float = Query(6.0, description="Minimum magnitude to include"),
-    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
-    end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
-    limit: int = Query(50, ge=1, le=500, description="Max number of records"),
-):
+@analytics_cache
+def api_high_magnitude_quakes(params: HighMagnitudeParams = Depends()):
     """
     Return high-magnitude earthquakes in a given date range.
     """
-    return get_high_magnitude_quakes(min_magnitude, start_date, end_date, limit)
+    return _high_magnitude_rows(params)
+
+
+@app.get("/analytics/high-magnitude/arrow", tags=["Analytics"])
+@arrow_analytics_cache
+def api_high_magnitude_quakes_arrow(params: HighMagnitudeParams = Depends()):
+    """
+    Same rows as /analytics/high-magnitude as an Arrow IPC stream.
+    """
+    return _high_magnitude_rows(params)
 
 # -----------------------
 # Query 6 – Regions with minimum quakes
 # -----------------------
 @app.get("/analytics/regions/with-min-quakes")
+@analytics_cache
 def api_regions_with_min_quakes(
     min_quakes: int = Query(10, ge=1, description="Minimum number of quakes"),
 ):
@@ -161,6 +370,7 @@ def api_regions_with_min_quakes(
 # Query 7 – Regions above average activity
 # -----------------------
 @app.get("/analytics/regions/above-average-activity")
+@analytics_cache
 def api_regions_above_average():
     """
     Return regions whose quake counts are above the global average.
@@ -170,24 +380,64 @@ def api_regions_above_average():
 # -----------------------
 # Query 8 – Multi-criteria earthquakes
 # -----------------------
+def check_multi_criteria_fields(fields):
+    """Reject field names that get_multi_criteria_quakes cannot select."""
+    if fields is not None:
+        unknown = sorted(set(fields) - MULTI_CRITERIA_COLUMNS.keys())
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}.",
+            )
+
+
 @app.get("/analytics/multi-criteria")
 def api_multi_criteria_quakes(
     min_magnitude: float = Query(5.5, description="Minimum magnitude"),
     min_risk_level: int = Query(4, ge=1, le=5, description="Minimum risk level"),
     min_population: int = Query(10_000_000, description="Minimum region population"),
+    fields: Optional[List[str]] = Query(
+        None,
+        description="Columns to return (repeat the parameter); defaults to all columns",
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Page size"),
+    offset: int = Query(0, ge=0, description="Rows to skip"),
 ):
     """
-    Return earthquakes that satisfy multi-table criteria:
+    Return one page of earthquakes that satisfy multi-table criteria:
       - magnitude >= min_magnitude
       - zone risk_level >= min_risk_level
       - region population >= min_population
     """
-    return get_multi_criteria_quakes(min_magnitude, min_risk_level, min_population)
+    check_multi_criteria_fields(fields)
+    return get_multi_criteria_quakes(
+        min_magnitude, min_risk_level, min_population, fields, limit, offset
+    )
+
+
+@app.get("/analytics/multi-criteria/stream", tags=["Analytics"])
+def api_multi_criteria_quakes_stream(
+    min_magnitude: float = Query(5.5, description="Minimum magnitude"),
+    min_risk_level: int = Query(4, ge=1, le=5, description="Minimum risk level"),
+    min_population: int = Query(10_000_000, description="Minimum region population"),
+    fields: Optional[List[str]] = Query(
+        None,
+        description="Columns to return (repeat the parameter); defaults to all columns",
+    ),
+):
+    """
+    Every row matching /analytics/multi-criteria (unpaginated), streamed as NDJSON.
+    """
+    check_multi_criteria_fields(fields)
+    return ndjson_response(
+        iter_multi_criteria_quakes(min_magnitude, min_risk_level, min_population, fields)
+    )
 
 # -----------------------
 # Query 9 – High population regions
 # -----------------------
 @app.get("/analytics/high-population-regions")
+@analytics_cache
 def api_high_population_regions(
     min_population: int = Query(10_000_000, description="Minimum region population"),
 ):
@@ -211,12 +461,56 @@ def api_region_risk_summary(region_id: int):
     - Seismic zone info
     - Aggregated earthquake stats
     """
-    results = get_region_risk_summary(region_id)
+    result = get_region_risk_summary(region_id)
 
-    if not results:
+    if result is None:
         raise HTTPException(
             status_code=404,
             detail=f"No risk summary available for region_id={region_id}.",
         )
 
-    return results[0]
\ No newline at end of file
+    return result
+
+
+@app.get(
+    "/regions/{region_id}/full",
+    response_model=RegionFullResponse,
+    tags=["Regions", "Analytics"],
+)
+def api_region_full(
+    region_id: int,
+    recent: int = Query(10, ge=1, le=100, description="Number of most recent earthquakes"),
+):
+    """
+    Return the region risk summary together with its most recent earthquakes,
+    so a region view needs one request. Returns 404 like /risk-summary.
+    """
+    result = get_region_full(region_id, recent)
+
+    if result["summary"] is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No risk summary available for region_id={region_id}.",
+        )
+
+    return result
+
+
+# -----------------------
+# Dashboard – Queries 4, 7 and 9 in one request
+# -----------------------
+@app.get(
+    "/analytics/dashboard",
+    response_model=DashboardResponse,
+    tags=["Analytics"],
+)
+@analytics_cache
+def api_dashboard(
+    top_n: int = Query(5, ge=1, le=10, description="Number of most active regions to return"),
+    min_population: int = Query(10_000_000, description="Minimum region population"),
+):
+    """
+    Return the most active, above-average and high-population regions in one
+    response, computed on a single database connection.
+    """
+    return get_dashboard(top_n, min_population)
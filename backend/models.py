@@ -1,17 +1,24 @@
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional
 
 
+# Relationships never lazy-load: touching quake.region (etc.) on an object
+# whose query did not load it with selectinload()/joinedload() raises instead
+# of silently issuing one SELECT per row.
+NO_LAZY_LOAD = {"lazy": "raise"}
+
+
 class Region(SQLModel, table=True):
     __tablename__ = "Region"
     
     region_id: int = Field(primary_key=True)
     region_name: str = Field(nullable=False)
     country: str = Field(nullable=False)
-    population: Optional[int] = None
+    population: Optional[int] = Field(default=None, index=True)
     
     # Relationship
-    earthquakes: list["Earthquake"] = Relationship(back_populates="region")
+    earthquakes: list["Earthquake"] = Relationship(back_populates="region", sa_relationship_kwargs=NO_LAZY_LOAD)
 
 
 class SeismicZone(SQLModel, table=True):
@@ -19,25 +26,55 @@ class SeismicZone(SQLModel, table=True):
     
     zone_id: int = Field(primary_key=True)
     zone_name: str = Field(nullable=False)
-    risk_level: int = Field(nullable=False)
+    risk_level: int = Field(nullable=False, index=True)
     
     # Relationship
-    earthquakes: list["Earthquake"] = Relationship(back_populates="zone")
+    earthquakes: list["Earthquake"] = Relationship(back_populates="zone", sa_relationship_kwargs=NO_LAZY_LOAD)
 
 
 class Earthquake(SQLModel, table=True):
     __tablename__ = "Earthquake"
     
     quake_id: Optional[int] = Field(default=None, primary_key=True)
-    datetime: str = Field(nullable=False)
+    datetime: str = Field(nullable=False)  # display only; filter and sort on time_ms
+    time_ms: Optional[int] = Field(default=None, index=True)  # UTC epoch milliseconds
     magnitude: float = Field(nullable=False)
     depth_km: float = Field(nullable=False)
     latitude: float = Field(nullable=False)
     longitude: float = Field(nullable=False)
     place: str = Field(nullable=False)
     region_id: int = Field(foreign_key="Region.region_id", nullable=False)
-    zone_id: int = Field(foreign_key="SeismicZone.zone_id", nullable=False)
+    zone_id: int = Field(foreign_key="SeismicZone.zone_id", nullable=False, index=True)
     
     # Relationships
-    region: Region = Relationship(back_populates="earthquakes")
-    zone: SeismicZone = Relationship(back_populates="earthquakes")
\ No newline at end of file
+    region: Region = Relationship(back_populates="earthquakes", sa_relationship_kwargs=NO_LAZY_LOAD)
+    zone: SeismicZone = Relationship(back_populates="earthquakes", sa_relationship_kwargs=NO_LAZY_LOAD)
+
+
+# Matches the ORDER BY of get_high_magnitude_quakes so the magnitude filter is
+# an index range scan that stops at LIMIT, with the date filter checked on
+# the same index entries.
+Index(
+    "ix_Earthquake_magnitude_time_ms",
+    Earthquake.magnitude.desc(),
+    Earthquake.time_ms.desc(),
+)
+
+# Lets get_quakes_in_region read one region's quakes already newest-first
+Index(
+    "ix_Earthquake_region_time_ms",
+    Earthquake.region_id,
+    Earthquake.time_ms.desc(),
+)
+
+
+class RegionQuakeCount(SQLModel, table=True):
+    """Per-region earthquake count, maintained by triggers on Earthquake."""
+    __tablename__ = "RegionQuakeCount"
+
+    region_id: int = Field(foreign_key="Region.region_id", primary_key=True)
+    quake_count: int = Field(default=0, nullable=False)
+
+
+# Lets get_most_active_regions read the top N counts in order and stop at LIMIT
+Index("ix_RegionQuakeCount_quake_count", RegionQuakeCount.quake_count.desc())
@@ -1,66 +1,252 @@
-from typing import Any, Dict, List
-from sqlmodel import Session, select, func
-from sqlalchemy import and_, between, text
+import math
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from sqlmodel import select, func
+from sqlalchemy import and_, between, bindparam, or_, text
 from .database import engine
-from .models import Earthquake, Region, SeismicZone
-
-
-def get_quakes_in_region(region_id: int):
-    """Get all earthquakes in a specific region."""
-    with Session(engine) as session:
-        statement = (
-            select(
-                Earthquake.quake_id,
-                Earthquake.datetime,
-                Earthquake.magnitude,
-                Earthquake.depth_km,
-                Earthquake.latitude,
-                Earthquake.longitude,
-                Earthquake.place,
-                Region.region_name
+from .models import Earthquake, Region, RegionQuakeCount, SeismicZone
+
+
+MS_PER_DAY = 86_400_000
+KM_PER_DEGREE_LAT = 111.32
+STREAM_BATCH_SIZE = 1024
+
+# Statements (raw SQL and select()) are built once at import and executed
+# with bound parameters, so each call reuses the same statement object and
+# hits the engine's compiled-statement cache without rebuilding the clause.
+AVG_MAGNITUDE_SQL = text("""
+    SELECT
+        r.region_id,
+        r.region_name,
+        AVG(e.magnitude) AS avg_magnitude
+    FROM Earthquake AS e
+    JOIN Region AS r ON e.region_id = r.region_id
+    WHERE r.region_id = :region_id
+    GROUP BY r.region_id, r.region_name
+    LIMIT 1
+""")
+
+# The R-Tree (see SPATIAL_INDEX_DDL in database.py) narrows the box to
+# candidate ids; it stores 32-bit floats rounded outwards, so the exact
+# BETWEEN on Earthquake still decides which candidates count. A box that
+# crosses the antimeridian is split into two disjoint longitude ranges, each
+# its own R-Tree probe; the second range is empty (min > max) otherwise.
+NEARBY_COUNT_SQL = text("""
+    SELECT (
+        SELECT COUNT(*)
+        FROM earthquake_rtree AS rt
+        JOIN Earthquake AS e ON e.quake_id = rt.id
+        WHERE rt.max_lat >= :lat_min AND rt.min_lat <= :lat_max
+          AND rt.max_lon >= :lon_min AND rt.min_lon <= :lon_max
+          AND e.latitude BETWEEN :lat_min AND :lat_max
+          AND e.longitude BETWEEN :lon_min AND :lon_max
+    ) + (
+        SELECT COUNT(*)
+        FROM earthquake_rtree AS rt
+        JOIN Earthquake AS e ON e.quake_id = rt.id
+        WHERE rt.max_lat >= :lat_min AND rt.min_lat <= :lat_max
+          AND rt.max_lon >= :wrap_lon_min AND rt.min_lon <= :wrap_lon_max
+          AND e.latitude BETWEEN :lat_min AND :lat_max
+          AND e.longitude BETWEEN :wrap_lon_min AND :wrap_lon_max
+    ) AS quake_count
+""")
+
+# One row per region: quake stats over the whole region, reported against the
+# highest-risk zone any of its quakes fall in. Both CTEs yield at most one row
+# (top_zone breaks risk_level ties on zone_id), so they are cross joined onto
+# the single Region row; the outer LIMIT 1 keeps the single-row contract that
+# _fetch_one() relies on. Regions without quakes return no row.
+RISK_SUMMARY_SQL = text("""
+    WITH quake_stats AS (
+        SELECT
+            COUNT(*) AS total_quakes,
+            AVG(magnitude) AS avg_magnitude,
+            MAX(magnitude) AS max_magnitude
+        FROM Earthquake
+        WHERE region_id = :region_id
+    ),
+    top_zone AS (
+        SELECT z.zone_name, z.risk_level
+        FROM SeismicZone AS z
+        WHERE z.zone_id IN (SELECT zone_id FROM Earthquake WHERE region_id = :region_id)
+        ORDER BY z.risk_level DESC, z.zone_id
+        LIMIT 1
+    )
+    SELECT
+        r.region_id,
+        r.region_name,
+        r.country,
+        r.population,
+        tz.zone_name,
+        tz.risk_level,
+        qs.total_quakes,
+        qs.avg_magnitude,
+        qs.max_magnitude
+    FROM Region AS r
+    CROSS JOIN top_zone AS tz
+    CROSS JOIN quake_stats AS qs
+    WHERE r.region_id = :region_id
+    LIMIT 1
+""")
+
+
+def _fetch_all(statement, params=None, conn=None):
+    """
+    Run a statement on a pooled connection and return its rows as mappings.
+    Pass conn to run on a connection the caller already holds instead.
+    """
+    if conn is not None:
+        return conn.execute(statement, params).mappings().all()
+    with engine.connect() as conn:
+        return conn.execute(statement, params).mappings().all()
+
+
+def _fetch_one(statement, params=None, conn=None):
+    """Like _fetch_all(), but return only the first row (or None)."""
+    if conn is not None:
+        return conn.execute(statement, params).mappings().first()
+    with engine.connect() as conn:
+        return conn.execute(statement, params).mappings().first()
+
+
+def _fetch_scalar(statement, params=None):
+    """Run a statement that yields exactly one row and column; return the value."""
+    with engine.connect() as conn:
+        return conn.execute(statement, params).scalar_one()
+
+
+def _iter_batches(statement, params=None, each_batch=None):
+    """
+    Yield a statement's rows as lists of at most STREAM_BATCH_SIZE mappings.
+    yield_per keeps SQLAlchemy from buffering the result, so only one batch
+    is held in memory at a time. The connection stays checked out until the
+    generator is exhausted or closed. each_batch(conn, batch), if given, is
+    applied to every batch on the same connection before it is yielded.
+    """
+    with engine.connect() as conn:
+        result = conn.execute(
+            statement, params, execution_options={"yield_per": STREAM_BATCH_SIZE}
+        )
+        for batch in result.mappings().partitions():
+            yield each_batch(conn, batch) if each_batch is not None else batch
+
+
+def _day_start_ms(day: date | str) -> int:
+    """UTC midnight of a date (or 'YYYY-MM-DD' string) as epoch milliseconds."""
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    midnight = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+    return int(midnight.timestamp()) * 1000
+
+
+QUAKES_IN_REGION_STMT = (
+    select(
+        Earthquake.quake_id,
+        Earthquake.datetime,
+        Earthquake.time_ms,
+        Earthquake.magnitude,
+        Earthquake.depth_km,
+        Earthquake.latitude,
+        Earthquake.longitude,
+        Earthquake.place,
+        Region.region_name
+    )
+    .select_from(Earthquake)
+    .join(Region)
+    .where(Earthquake.region_id == bindparam("region_id"))
+    # quake_id breaks ties between quakes with the same time_ms. It is the
+    # rowid, which ix_Earthquake_region_time_ms already stores ascending
+    # after time_ms, so this is still a plain walk of the index.
+    .order_by(Earthquake.time_ms.desc(), Earthquake.quake_id)
+)
+
+# One page of QUAKES_IN_REGION_STMT. The keyset variant resumes right after
+# the (time_ms, quake_id) of the previous page's last row, so the index seek
+# lands on the page directly instead of skipping `offset` rows.
+QUAKES_IN_REGION_PAGE_STMT = (
+    QUAKES_IN_REGION_STMT
+    .limit(bindparam("limit"))
+    .offset(bindparam("offset"))
+)
+QUAKES_IN_REGION_AFTER_STMT = (
+    QUAKES_IN_REGION_STMT
+    .where(
+        and_(
+            Earthquake.time_ms <= bindparam("cursor_ms"),
+            or_(
+                Earthquake.time_ms < bindparam("cursor_ms"),
+                Earthquake.quake_id > bindparam("cursor_id")
             )
-            .select_from(Earthquake)
-            .join(Region)
-            .where(Region.region_id == region_id)
-            .order_by(Earthquake.datetime.desc())
         )
-        results = session.exec(statement).all()
-        return [
-            {
-                "quake_id": r[0],
-                "datetime": r[1],
-                "magnitude": r[2],
-                "depth_km": r[3],
-                "latitude": r[4],
-                "longitude": r[5],
-                "place": r[6],
-                "region_name": r[7],
-            }
-            for r in results
-        ]
+    )
+    .limit(bindparam("limit"))
+    .offset(bindparam("offset"))
+)
+
+
+def get_quakes_in_region(
+    region_id: int,
+    limit: int = 100,
+    offset: int = 0,
+    cursor_ms: int | None = None,
+    cursor_id: int | None = None,
+    conn=None,
+):
+    """
+    Get one page of the earthquakes in a specific region, newest first.
+    Pass the time_ms and quake_id of the previous page's last row as
+    cursor_ms / cursor_id (both or neither) to fetch the page after it.
+    """
+    if (cursor_ms is None) != (cursor_id is None):
+        raise ValueError("cursor_ms and cursor_id must be given together")
+    params = {"region_id": region_id, "limit": limit, "offset": offset}
+    if cursor_ms is None:
+        return _fetch_all(QUAKES_IN_REGION_PAGE_STMT, params, conn=conn)
+    params.update(cursor_ms=cursor_ms, cursor_id=cursor_id)
+    return _fetch_all(QUAKES_IN_REGION_AFTER_STMT, params, conn=conn)
+
+
+def iter_quakes_in_region(region_id: int):
+    """Yield all of a region's earthquakes in batches, newest first."""
+    return _iter_batches(QUAKES_IN_REGION_STMT, {"region_id": region_id})
 
 
 def get_avg_magnitude_in_region(region_id: int):
     """Calculate the average earthquake magnitude for a specific region."""
-    with Session(engine) as session:
-        sql = text("""
-            SELECT
-                r.region_id,
-                r.region_name,
-                AVG(e.magnitude) AS avg_magnitude
-            FROM Earthquake AS e
-            JOIN Region AS r ON e.region_id = r.region_id
-            WHERE r.region_id = :region_id
-            GROUP BY r.region_id, r.region_name
-        """).bindparams(region_id=region_id)
-        result = session.exec(sql).first()
-        if result is None:
-            return None
-        return {
-            "region_id": result[0],
-            "region_name": result[1],
-            "avg_magnitude": float(result[2]) if result[2] is not None else None,
-        }
+    return _fetch_one(AVG_MAGNITUDE_SQL, {"region_id": region_id})
+
+
+def radius_to_deltas(lat_center: float, radius_km: float):
+    """
+    Half-widths in degrees of the lat/lon box enclosing a radius_km circle.
+    A degree of longitude shrinks with cos(latitude); near the poles the
+    half-width reaches 180, i.e. the box spans every longitude.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(lat_center))
+    lon_delta = lat_delta / cos_lat if cos_lat > 1e-6 else 180.0
+    return lat_delta, min(lon_delta, 180.0)
+
+
+# (min, max) with min > max, which no longitude falls between
+EMPTY_LON_RANGE = (1.0, 0.0)
+
+
+def longitude_ranges(lon_center: float, lon_delta: float):
+    """
+    Split lon_center +/- lon_delta into two longitude ranges within
+    [-180, 180]. The second is EMPTY_LON_RANGE unless the box wraps across
+    the antimeridian.
+    """
+    if lon_delta >= 180.0:
+        return (-180.0, 180.0), EMPTY_LON_RANGE
+    lon_min = lon_center - lon_delta
+    lon_max = lon_center + lon_delta
+    if lon_min < -180.0:
+        return (-180.0, lon_max), (lon_min + 360.0, 180.0)
+    if lon_max > 180.0:
+        return (lon_min, 180.0), (-180.0, lon_max - 360.0)
+    return (lon_min, lon_max), EMPTY_LON_RANGE
 
 
 def count_quakes_near_location(
@@ -70,279 +256,366 @@ def count_quakes_near_location(
     lon_delta: float = 1.0,
 ):
     """Count earthquakes within a bounding box around a given location."""
-    lat_min = lat_center - lat_delta
-    lat_max = lat_center + lat_delta
-    lon_min = lon_center - lon_delta
-    lon_max = lon_center + lon_delta
+    (lon_min, lon_max), (wrap_lon_min, wrap_lon_max) = longitude_ranges(lon_center, lon_delta)
+    params = {
+        "lat_min": lat_center - lat_delta,
+        "lat_max": lat_center + lat_delta,
+        "lon_min": lon_min,
+        "lon_max": lon_max,
+        "wrap_lon_min": wrap_lon_min,
+        "wrap_lon_max": wrap_lon_max,
+    }
+    return {"quake_count": _fetch_scalar(NEARBY_COUNT_SQL, params)}
 
-    with Session(engine) as session:
-        statement = select(func.count(Earthquake.quake_id).label("quake_count")).where(
-            and_(
-                between(Earthquake.latitude, lat_min, lat_max),
-                between(Earthquake.longitude, lon_min, lon_max)
-            )
-        )
-        result = session.exec(statement).first() or 0
-        return [{"quake_count": result}]
+
+MOST_ACTIVE_STMT = (
+    select(
+        Region.region_id,
+        Region.region_name,
+        Region.country,
+        RegionQuakeCount.quake_count
+    )
+    .select_from(RegionQuakeCount)
+    .join(Region)
+    .where(RegionQuakeCount.quake_count > 0)
+    .order_by(RegionQuakeCount.quake_count.desc())
+    .limit(bindparam("top_n"))
+)
 
 
-def get_most_active_regions(top_n: int = 5):
+def get_most_active_regions(top_n: int = 5, conn=None):
     """
     Return the top-N regions by earthquake count.
     """
-    with Session(engine) as session:
-        statement = (
-            select(
-                Region.region_id,
-                Region.region_name,
-                Region.country,
-                func.count(Earthquake.quake_id).label("quake_count")
-            )
-            .select_from(Earthquake)
-            .join(Region)
-            .group_by(Region.region_id, Region.region_name, Region.country)
-            .order_by(func.count(Earthquake.quake_id).desc())
-            .limit(top_n)
+    return _fetch_all(MOST_ACTIVE_STMT, {"top_n": top_n}, conn=conn)
+
+
+HIGH_MAGNITUDE_STMT = (
+    select(
+        Earthquake.quake_id,
+        Earthquake.datetime,
+        Earthquake.magnitude,
+        Earthquake.depth_km,
+        Earthquake.latitude,
+        Earthquake.longitude,
+        Earthquake.place
+    )
+    .where(
+        and_(
+            Earthquake.magnitude >= bindparam("min_magnitude"),
+            # likely() tells the planner the date range is wide, so it
+            # walks ix_Earthquake_magnitude_time_ms in ORDER BY order
+            # instead of range-scanning time_ms and sorting.
+            func.likely(between(Earthquake.time_ms, bindparam("start_ms"), bindparam("end_ms")))
         )
-        results = session.exec(statement).all()
-        return [
-            {
-                "region_id": r[0],
-                "region_name": r[1],
-                "country": r[2],
-                "quake_count": r[3],
-            }
-            for r in results
-        ]
+    )
+    .order_by(Earthquake.magnitude.desc(), Earthquake.time_ms.desc())
+    .limit(bindparam("limit"))
+)
 
 
 def get_high_magnitude_quakes(
     min_magnitude: float,
-    start_date: str,
-    end_date: str,
+    start_date: date | str,
+    end_date: date | str,
     limit: int = 50,
 ):
     """Get high-magnitude earthquakes within a specific date range."""
-    start_ts = start_date + " 00:00:00"
-    end_ts = end_date + " 23:59:59"
-
-    with Session(engine) as session:
-        statement = (
-            select(
-                Earthquake.quake_id,
-                Earthquake.datetime,
-                Earthquake.magnitude,
-                Earthquake.depth_km,
-                Earthquake.latitude,
-                Earthquake.longitude,
-                Earthquake.place
-            )
-            .where(
-                and_(
-                    Earthquake.magnitude >= min_magnitude,
-                    between(Earthquake.datetime, start_ts, end_ts)
-                )
-            )
-            .order_by(Earthquake.magnitude.desc(), Earthquake.datetime.desc())
-            .limit(limit)
-        )
-        results = session.exec(statement).all()
-        return [
-            {
-                "quake_id": r[0],
-                "datetime": r[1],
-                "magnitude": r[2],
-                "depth_km": r[3],
-                "latitude": r[4],
-                "longitude": r[5],
-                "place": r[6],
-            }
-            for r in results
-        ]
+    # Whole UTC days, compared as integer epoch ms against time_ms
+    params = {
+        "min_magnitude": min_magnitude,
+        "start_ms": _day_start_ms(start_date),
+        "end_ms": _day_start_ms(end_date) + MS_PER_DAY - 1,
+        "limit": limit,
+    }
+    return _fetch_all(HIGH_MAGNITUDE_STMT, params)
+
+
+MIN_QUAKES_STMT = (
+    select(
+        Region.region_id,
+        Region.region_name,
+        RegionQuakeCount.quake_count
+    )
+    .select_from(RegionQuakeCount)
+    .join(Region)
+    .where(RegionQuakeCount.quake_count > bindparam("min_quakes"))
+    .order_by(RegionQuakeCount.quake_count.desc())
+)
+
 
 def get_regions_with_min_quakes(min_quakes: int):
     """Get regions that have more than a minimum number of earthquakes."""
-    with Session(engine) as session:
-        statement = (
-            select(
-                Region.region_id,
-                Region.region_name,
-                func.count(Earthquake.quake_id).label("quake_count")
-            )
-            .select_from(Earthquake)
-            .join(Region)
-            .group_by(Region.region_id, Region.region_name)
-            .having(func.count(Earthquake.quake_id) > min_quakes)
-            .order_by(func.count(Earthquake.quake_id).desc())
-        )
-        results = session.exec(statement).all()
-        return [
-            {
-                "region_id": r[0],
-                "region_name": r[1],
-                "quake_count": r[2],
-            }
-            for r in results
-        ]
+    return _fetch_all(MIN_QUAKES_STMT, {"min_quakes": min_quakes})
+
+# The all-region average is a window over the counts, computed in the same
+# pass that reads them; the outer query keeps the regions above it.
+_region_counts_with_avg = (
+    select(
+        Region.region_id,
+        Region.region_name,
+        RegionQuakeCount.quake_count,
+        func.avg(RegionQuakeCount.quake_count).over().label("avg_quakes")
+    )
+    .select_from(RegionQuakeCount)
+    .join(Region)
+    .where(RegionQuakeCount.quake_count > 0)
+    .subquery()
+)
 
-def get_regions_above_average_quakes():
+ABOVE_AVERAGE_STMT = (
+    select(_region_counts_with_avg)
+    .where(_region_counts_with_avg.c.quake_count > _region_counts_with_avg.c.avg_quakes)
+    .order_by(_region_counts_with_avg.c.quake_count.desc())
+)
+
+
+def get_regions_above_average_quakes(conn=None):
     """Get regions with earthquake counts above the global average."""
-    from sqlalchemy import text
-    
-    with Session(engine) as session:
-        # Using raw SQL for CTE
-        sql = text("""
-            WITH region_counts AS (
-                SELECT
-                    region_id,
-                    COUNT(*) AS quake_count
-                FROM Earthquake
-                GROUP BY region_id
-            ),
-            avg_count AS (
-                SELECT AVG(quake_count) AS avg_quakes
-                FROM region_counts
-            )
-            SELECT
-                r.region_id,
-                r.region_name,
-                rc.quake_count,
-                a.avg_quakes
-            FROM region_counts AS rc
-            JOIN avg_count AS a
-            JOIN Region AS r ON rc.region_id = r.region_id
-            WHERE rc.quake_count > a.avg_quakes
-            ORDER BY rc.quake_count DESC;
-        """)
-        results = session.exec(sql).all()
-        return [
-            {
-                "region_id": r[0],
-                "region_name": r[1],
-                "quake_count": r[2],
-                "avg_quakes": r[3],
-            }
-            for r in results
+    return _fetch_all(ABOVE_AVERAGE_STMT, conn=conn)
+
+# Columns get_multi_criteria_quakes can return, in response order. Clients
+# pick a subset by name; anything not listed here is rejected.
+MULTI_CRITERIA_COLUMNS = {
+    "quake_id": Earthquake.quake_id,
+    "datetime": Earthquake.datetime,
+    "magnitude": Earthquake.magnitude,
+    "depth_km": Earthquake.depth_km,
+    "latitude": Earthquake.latitude,
+    "longitude": Earthquake.longitude,
+    "place": Earthquake.place,
+    "region_name": Region.region_name,
+    "population": Region.population,
+    "zone_name": SeismicZone.zone_name,
+    "risk_level": SeismicZone.risk_level,
+}
+
+
+# Lookup tables get_multi_criteria_quakes can pull columns from, keyed by the
+# Earthquake foreign key that points at them
+MULTI_CRITERIA_LOOKUPS = (
+    (Earthquake.region_id, Region.region_id),
+    (Earthquake.zone_id, SeismicZone.zone_id),
+)
+
+
+@lru_cache(maxsize=64)
+def _multi_criteria_statement(fields=None):
+    """
+    Build (once per distinct column set) the multi-criteria select; the
+    thresholds are bound parameters. fields is None or a frozenset of names.
+    Returns (statement, names, lookups), see _attach_lookup_columns().
+    """
+    names = tuple(name for name in MULTI_CRITERIA_COLUMNS if fields is None or name in fields)
+    columns = [
+        MULTI_CRITERIA_COLUMNS[name] for name in names
+        if MULTI_CRITERIA_COLUMNS[name].class_ is Earthquake
+    ]
+    # Region / SeismicZone columns are not joined onto every quake row. The
+    # quake query only carries the foreign key, and each table's requested
+    # columns are read once per distinct id with a separate IN (...) select.
+    lookups = []
+    for foreign_key, primary_key in MULTI_CRITERIA_LOOKUPS:
+        lookup_columns = [
+            MULTI_CRITERIA_COLUMNS[name] for name in names
+            if MULTI_CRITERIA_COLUMNS[name].class_ is primary_key.class_
         ]
+        if lookup_columns:
+            columns.append(foreign_key)
+            lookups.append((
+                foreign_key.key,
+                select(primary_key, *lookup_columns)
+                .where(primary_key.in_(bindparam("ids", expanding=True))),
+            ))
+
+    eligible_regions = select(Region.region_id).where(
+        and_(
+            Region.population.is_not(None),
+            Region.population >= bindparam("min_population")
+        )
+    )
+    eligible_zones = select(SeismicZone.zone_id).where(
+        SeismicZone.risk_level >= bindparam("min_risk_level")
+    )
+
+    statement = (
+        select(*columns)
+        .select_from(Earthquake)
+        .where(
+            and_(
+                Earthquake.magnitude >= bindparam("min_magnitude"),
+                # Resolve the small lookup tables to id lists first so the
+                # Earthquake scan is filtered before any rows are read
+                Earthquake.region_id.in_(eligible_regions),
+                Earthquake.zone_id.in_(eligible_zones)
+            )
+        )
+        .order_by(Earthquake.magnitude.desc(), Earthquake.time_ms.desc(), Earthquake.quake_id)
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+    return statement, names, tuple(lookups)
+
+
+def _attach_lookup_columns(conn, rows, names, lookups):
+    """
+    Fill in the Region / SeismicZone columns of a batch of quake rows. Runs
+    one select per lookup table for the ids in the batch and returns dicts
+    with exactly the requested names, in MULTI_CRITERIA_COLUMNS order.
+    """
+    if not lookups:
+        return rows
+    found = {}
+    for key, lookup in lookups:
+        ids = list({row[key] for row in rows})
+        found[key] = (
+            {match[key]: match for match in conn.execute(lookup, {"ids": ids}).mappings()}
+            if ids else {}
+        )
+    merged = []
+    for row in rows:
+        values = dict(row)
+        for key, _ in lookups:
+            values.update(found[key][row[key]])
+        merged.append({name: values[name] for name in names})
+    return merged
+
+
+def _multi_criteria_args(
+    min_magnitude, min_risk_level, min_population, fields, limit=None, offset=0
+):
+    statement, names, lookups = _multi_criteria_statement(
+        frozenset(fields) if fields is not None else None
+    )
+    params = {
+        "min_magnitude": min_magnitude,
+        "min_risk_level": min_risk_level,
+        "min_population": min_population,
+        # SQLite reads a negative LIMIT as "no limit"
+        "limit": limit if limit is not None else -1,
+        "offset": offset,
+    }
+    return statement, params, names, lookups
+
 
 def get_multi_criteria_quakes(
     min_magnitude: float,
     min_risk_level: int,
     min_population: int,
+    fields=None,
+    limit: int = 100,
+    offset: int = 0,
 ):
-    """Get earthquakes meeting multiple criteria: minimum magnitude, risk level, and population."""
-    with Session(engine) as session:
-        statement = (
-            select(
-                Earthquake.quake_id,
-                Earthquake.datetime,
-                Earthquake.magnitude,
-                Earthquake.depth_km,
-                Earthquake.latitude,
-                Earthquake.longitude,
-                Earthquake.place,
-                Region.region_name,
-                Region.population,
-                SeismicZone.zone_name,
-                SeismicZone.risk_level
-            )
-            .select_from(Earthquake)
-            .join(Region)
-            .join(SeismicZone)
-            .where(
-                and_(
-                    Earthquake.magnitude >= min_magnitude,
-                    SeismicZone.risk_level >= min_risk_level,
-                    Region.population.is_not(None),
-                    Region.population >= min_population
-                )
-            )
-            .order_by(Earthquake.magnitude.desc(), Earthquake.datetime.desc())
+    """
+    Get one page of earthquakes meeting multiple criteria: minimum magnitude,
+    risk level, and population, strongest first.
+    fields limits the returned columns to those names in MULTI_CRITERIA_COLUMNS
+    (all of them by default).
+    """
+    statement, params, names, lookups = _multi_criteria_args(
+        min_magnitude, min_risk_level, min_population, fields, limit, offset
+    )
+    with engine.connect() as conn:
+        rows = _fetch_all(statement, params, conn=conn)
+        return _attach_lookup_columns(conn, rows, names, lookups)
+
+
+def iter_multi_criteria_quakes(
+    min_magnitude: float,
+    min_risk_level: int,
+    min_population: int,
+    fields=None,
+):
+    """Like get_multi_criteria_quakes(), but yield every matching row in batches."""
+    statement, params, names, lookups = _multi_criteria_args(
+        min_magnitude, min_risk_level, min_population, fields
+    )
+    return _iter_batches(
+        statement,
+        params,
+        each_batch=lambda conn, batch: _attach_lookup_columns(conn, batch, names, lookups),
+    )
+
+HIGH_POPULATION_STMT = (
+    select(
+        Region.region_id,
+        Region.region_name,
+        Region.population,
+        RegionQuakeCount.quake_count
+    )
+    .select_from(RegionQuakeCount)
+    .join(Region)
+    .where(
+        and_(
+            RegionQuakeCount.quake_count > 0,
+            Region.population.is_not(None),
+            Region.population >= bindparam("min_population")
         )
-        results = session.exec(statement).all()
-        return [
-            {
-                "quake_id": r[0],
-                "datetime": r[1],
-                "magnitude": r[2],
-                "depth_km": r[3],
-                "latitude": r[4],
-                "longitude": r[5],
-                "place": r[6],
-                "region_name": r[7],
-                "population": r[8],
-                "zone_name": r[9],
-                "risk_level": r[10],
-            }
-            for r in results
-        ]
+    )
+    .order_by(RegionQuakeCount.quake_count.desc())
+)
 
-def get_quakes_in_high_population_regions(min_population: int):
+
+def get_quakes_in_high_population_regions(min_population: int, conn=None):
     """Get earthquake counts for regions with population above a minimum threshold."""
-    with Session(engine) as session:
-        statement = (
-            select(
-                Region.region_id,
-                Region.region_name,
-                Region.population,
-                func.count(Earthquake.quake_id).label("quake_count")
-            )
-            .select_from(Earthquake)
-            .join(Region)
-            .where(
-                and_(
-                    Region.population.is_not(None),
-                    Region.population >= min_population
-                )
-            )
-            .group_by(Region.region_id, Region.region_name, Region.population)
-            .order_by(func.count(Earthquake.quake_id).desc())
-        )
-        results = session.exec(statement).all()
-        return [
-            {
-                "region_id": r[0],
-                "region_name": r[1],
-                "population": r[2],
-                "quake_count": r[3],
-            }
-            for r in results
-        ]
+    return _fetch_all(HIGH_POPULATION_STMT, {"min_population": min_population}, conn=conn)
 
-def get_region_risk_summary(region_id: int):
+def get_region_risk_summary(region_id: int, conn=None):
     """Get a comprehensive seismic risk summary for a specific region."""
-    with Session(engine) as session:
-        statement = (
-            select(
-                Region.region_id,
-                Region.region_name,
-                SeismicZone.zone_name,
-                SeismicZone.risk_level,
-                func.count(Earthquake.quake_id).label("total_quakes"),
-                func.avg(Earthquake.magnitude).label("avg_magnitude"),
-                func.max(Earthquake.magnitude).label("max_magnitude")
-            )
-            .select_from(Region)
-            .join(Earthquake)
-            .join(SeismicZone)
-            .where(Region.region_id == region_id)
-            .group_by(
-                Region.region_id,
-                Region.region_name,
-                SeismicZone.zone_name,
-                SeismicZone.risk_level
-            )
-        )
-        results = session.exec(statement).all()
-        return [
-            {
-                "region_id": r[0],
-                "region_name": r[1],
-                "zone_name": r[2],
-                "risk_level": r[3],
-                "total_quakes": r[4],
-                "avg_magnitude": float(r[5]) if r[5] is not None else None,
-                "max_magnitude": float(r[6]) if r[6] is not None else None,
-            }
-            for r in results
-        ]
\ No newline at end of file
+    return _fetch_one(RISK_SUMMARY_SQL, {"region_id": region_id}, conn=conn)
+
+
+def get_region_full(region_id: int, recent: int = 10):
+    """
+    A region's risk summary plus its most recent earthquakes in one call.
+    Both queries share a single pooled connection.
+    """
+    with engine.connect() as conn:
+        return {
+            "summary": get_region_risk_summary(region_id, conn=conn),
+            "recent_quakes": get_quakes_in_region(region_id, limit=recent, conn=conn),
+        }
+
+
+# Every region with quakes, plus the all-region average, in one pass. The
+# dashboard's three lists are all cut from these few rows (one per region).
+DASHBOARD_STMT = (
+    select(
+        Region.region_id,
+        Region.region_name,
+        Region.country,
+        Region.population,
+        RegionQuakeCount.quake_count,
+        func.avg(RegionQuakeCount.quake_count).over().label("avg_quakes")
+    )
+    .select_from(RegionQuakeCount)
+    .join(Region)
+    .where(RegionQuakeCount.quake_count > 0)
+    .order_by(RegionQuakeCount.quake_count.desc())
+)
+
+
+def get_dashboard(top_n: int = 5, min_population: int = 10_000_000, conn=None):
+    """
+    Most-active, above-average and high-population regions in one call.
+    Runs a single statement and splits its rows into the three lists, which
+    match get_most_active_regions(), get_regions_above_average_quakes() and
+    get_quakes_in_high_population_regions().
+    """
+    rows = _fetch_all(DASHBOARD_STMT, conn=conn)
+    return {
+        "most_active": [
+            {key: row[key] for key in ("region_id", "region_name", "country", "quake_count")}
+            for row in rows[:top_n]
+        ],
+        "above_average": [
+            {key: row[key] for key in ("region_id", "region_name", "quake_count", "avg_quakes")}
+            for row in rows
+            if row["quake_count"] > row["avg_quakes"]
+        ],
+        "high_population": [
+            {key: row[key] for key in ("region_id", "region_name", "population", "quake_count")}
+            for row in rows
+            if row["population"] is not None and row["population"] >= min_population
+        ],
+    }
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from sqlmodel import SQLModel
 
 
@@ -6,6 +6,7 @@ class EarthquakeInRegion(SQLModel):
     """Single earthquake row with region name, used for /regions/{id}/earthquakes."""
     quake_id: int
     datetime: str
+    time_ms: Optional[int]
     magnitude: float
     depth_km: float
     latitude: float
@@ -27,11 +28,50 @@ class NearbyCountResponse(SQLModel):
 
 
 class RegionRiskSummary(SQLModel):
-    """Risk summary for a region, based on its zone and historical quakes."""
+    """Risk summary for a region, based on its highest-risk zone and all of its quakes."""
     region_id: int
     region_name: str
+    country: str
+    population: Optional[int]
     zone_name: str
     risk_level: int
     total_quakes: int
     avg_magnitude: Optional[float]
-    max_magnitude: Optional[float]
\ No newline at end of file
+    max_magnitude: Optional[float]
+
+
+class RegionFullResponse(SQLModel):
+    """Combined payload for /regions/{id}/full."""
+    summary: RegionRiskSummary
+    recent_quakes: List[EarthquakeInRegion]
+
+
+class ActiveRegion(SQLModel):
+    """Region with its earthquake count, used by the dashboard."""
+    region_id: int
+    region_name: str
+    country: str
+    quake_count: int
+
+
+class AboveAverageRegion(SQLModel):
+    """Region whose quake count is above the all-region average."""
+    region_id: int
+    region_name: str
+    quake_count: int
+    avg_quakes: float
+
+
+class HighPopulationRegion(SQLModel):
+    """Quake count for a region above the population threshold."""
+    region_id: int
+    region_name: str
+    population: int
+    quake_count: int
+
+
+class DashboardResponse(SQLModel):
+    """Combined payload for /analytics/dashboard."""
+    most_active: List[ActiveRegion]
+    above_average: List[AboveAverageRegion]
+    high_population: List[HighPopulationRegion]
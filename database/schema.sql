@@ -1,5 +1,7 @@
 PRAGMA foreign_keys = ON;
 
+DROP TABLE IF EXISTS earthquake_rtree;
+DROP TABLE IF EXISTS RegionQuakeCount;
 DROP TABLE IF EXISTS Earthquake;
 DROP TABLE IF EXISTS SeismicZone;
 DROP TABLE IF EXISTS Region;
@@ -24,6 +26,7 @@ CREATE TABLE SeismicZone (
 CREATE TABLE Earthquake (
     quake_id   INTEGER PRIMARY KEY AUTOINCREMENT,
     datetime   TEXT    NOT NULL,  -- stored as 'YYYY-MM-DD HH:MM:SS' UTC
+    time_ms    INTEGER,           -- same instant as UTC epoch ms; filter/sort on this
     magnitude  REAL    NOT NULL
     CHECK (magnitude >= 0 AND magnitude <= 10),
     depth_km   REAL    NOT NULL,
@@ -34,4 +37,60 @@ CREATE TABLE Earthquake (
     zone_id    INTEGER NOT NULL,
     FOREIGN KEY (region_id) REFERENCES Region(region_id),
     FOREIGN KEY (zone_id)   REFERENCES SeismicZone(zone_id)
-);
\ No newline at end of file
+);
+
+-- 4. Per-region earthquake counts, maintained by the triggers below
+CREATE TABLE RegionQuakeCount (
+    region_id   INTEGER PRIMARY KEY,
+    quake_count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (region_id) REFERENCES Region(region_id)
+);
+
+-- Indexes used by the analytics queries
+CREATE INDEX ix_RegionQuakeCount_quake_count ON RegionQuakeCount (quake_count DESC);
+CREATE INDEX ix_Region_population        ON Region (population);
+CREATE INDEX ix_SeismicZone_risk_level   ON SeismicZone (risk_level);
+CREATE INDEX ix_Earthquake_time_ms   ON Earthquake (time_ms);
+CREATE INDEX ix_Earthquake_zone_id   ON Earthquake (zone_id);
+CREATE INDEX ix_Earthquake_magnitude_time_ms
+    ON Earthquake (magnitude DESC, time_ms DESC);
+CREATE INDEX ix_Earthquake_region_time_ms
+    ON Earthquake (region_id, time_ms DESC);
+-- Spatial index over each quake's point, kept in sync by triggers
+CREATE VIRTUAL TABLE earthquake_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+
+CREATE TRIGGER earthquake_rtree_insert AFTER INSERT ON Earthquake
+BEGIN
+    INSERT INTO earthquake_rtree
+    VALUES (new.quake_id, new.latitude, new.latitude, new.longitude, new.longitude);
+END;
+
+CREATE TRIGGER earthquake_rtree_update AFTER UPDATE OF quake_id, latitude, longitude ON Earthquake
+BEGIN
+    DELETE FROM earthquake_rtree WHERE id = old.quake_id;
+    INSERT INTO earthquake_rtree
+    VALUES (new.quake_id, new.latitude, new.latitude, new.longitude, new.longitude);
+END;
+
+CREATE TRIGGER earthquake_rtree_delete AFTER DELETE ON Earthquake
+BEGIN
+    DELETE FROM earthquake_rtree WHERE id = old.quake_id;
+END;
+
+CREATE TRIGGER region_count_insert AFTER INSERT ON Earthquake
+BEGIN
+    INSERT INTO RegionQuakeCount (region_id, quake_count) VALUES (new.region_id, 1)
+    ON CONFLICT (region_id) DO UPDATE SET quake_count = quake_count + 1;
+END;
+
+CREATE TRIGGER region_count_update AFTER UPDATE OF region_id ON Earthquake
+BEGIN
+    UPDATE RegionQuakeCount SET quake_count = quake_count - 1 WHERE region_id = old.region_id;
+    INSERT INTO RegionQuakeCount (region_id, quake_count) VALUES (new.region_id, 1)
+    ON CONFLICT (region_id) DO UPDATE SET quake_count = quake_count + 1;
+END;
+
+CREATE TRIGGER region_count_delete AFTER DELETE ON Earthquake
+BEGIN
+    UPDATE RegionQuakeCount SET quake_count = quake_count - 1 WHERE region_id = old.region_id;
+END;
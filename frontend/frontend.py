@@ -1,8 +1,10 @@
+import io
+import pyarrow as pa
 import requests
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import json
+import orjson
 
 # Configuration
 API_BASE_URL = "http://127.0.0.1:8000"
@@ -18,6 +20,11 @@ st.set_page_config(
 # Initialize session state
 if "api_error" not in st.session_state:
     st.session_state.api_error = None
+if "http" not in st.session_state:
+    # One keep-alive connection to the API per browser session, reused
+    # across reruns instead of reconnecting for every request
+    st.session_state.http = requests.Session()
+http = st.session_state.http
 
 # Custom CSS
 st.markdown("""
@@ -31,11 +38,16 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+@st.cache_data(ttl=10, show_spinner=False)
+def cached_api_health():
+    # Raises when the API is down, so only a healthy answer is cached
+    http.get(f"{API_BASE_URL}/", timeout=5).raise_for_status()
+    return True
+
 def check_api_health():
-    """Check if the API is running"""
+    """Check if the API is running (a healthy answer is cached for a few seconds)"""
     try:
-        response = requests.get(f"{API_BASE_URL}/", timeout=5)
-        return response.status_code == 200
+        return cached_api_health()
     except Exception:
         return False
 
@@ -47,6 +59,70 @@ def display_success(message: str):
     """Display success message"""
     st.success(f"✅ {message}")
 
+def read_ndjson(response) -> pd.DataFrame:
+    """Load a newline-delimited JSON (/stream endpoint) response into a DataFrame"""
+    return pd.read_json(io.BytesIO(response.content), lines=True, convert_dates=False)
+
+def records_frame(rows: list) -> pd.DataFrame:
+    """Build a DataFrame from API row dicts, keeping the API's column order"""
+    return pd.DataFrame.from_records(rows, columns=list(rows[0]) if rows else [])
+
+class APIError(Exception):
+    """Non-200 API response; raised inside the cached fetchers so it is never cached"""
+    def __init__(self, status_code: int, body: dict):
+        super().__init__(status_code)
+        self.status_code = status_code
+        self.body = body
+
+def get_ok(path: str, params: dict | None = None):
+    """GET an API endpoint, raising APIError unless it answers 200"""
+    response = http.get(f"{API_BASE_URL}{path}", params=params, timeout=30)
+    if response.status_code != 200:
+        try:
+            body = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            body = {"detail": f"API returned HTTP {response.status_code}"}
+        raise APIError(response.status_code, body)
+    return response
+
+# Query results are cached per (path, params), so widget reruns and repeated
+# button presses with the same inputs do not call the API again. The TTL
+# bounds how stale a result can get after fetch_data loads new quakes. Only
+# successful responses are cached: errors and connection failures raise out
+# of the cached functions, so the next attempt asks the API again.
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_json(path: str, params: dict | None = None):
+    return orjson.loads(get_ok(path, params).content)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_ndjson(path: str, params: dict | None = None):
+    return read_ndjson(get_ok(path, params))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_arrow(path: str, params: dict | None = None):
+    return pa.ipc.open_stream(get_ok(path, params).content).read_all()
+
+def fetch_json(path: str, params: dict | None = None):
+    """GET an API endpoint; returns (status_code, parsed JSON body)"""
+    try:
+        return 200, cached_json(path, params)
+    except APIError as e:
+        return e.status_code, e.body
+
+def fetch_ndjson(path: str, params: dict | None = None):
+    """GET a /stream endpoint; returns (status_code, DataFrame or error body)"""
+    try:
+        return 200, cached_ndjson(path, params)
+    except APIError as e:
+        return e.status_code, e.body
+
+def fetch_arrow(path: str, params: dict | None = None):
+    """GET an /arrow endpoint; returns (status_code, pyarrow Table or error body)"""
+    try:
+        return 200, cached_arrow(path, params)
+    except APIError as e:
+        return e.status_code, e.body
+
 # Header
 st.title("Earthquake Analytics System")
 st.markdown("---")
@@ -80,11 +156,12 @@ with st.sidebar.expander("Regions", expanded=True):
     "9. Caribbean Arc (Puerto Rico / USVI)\n" 
     "10. Other" )
 st.sidebar.markdown("---")
-api_status = "🟢 Online" if check_api_health() else "🔴 Offline"
+api_healthy = check_api_health()
+api_status = "🟢 Online" if api_healthy else "🔴 Offline"
 st.sidebar.write(f"**API Status:** {api_status}")
 
 # Main content area
-if not check_api_health():
+if not api_healthy:
     display_error("API is not responding. Please ensure the backend is running on http://127.0.0.1:8000")
     st.stop()
 
@@ -95,20 +172,44 @@ if query_type == "1. Earthquakes in Region":
     
     with col1:
         region_id = st.number_input("Enter Region ID", min_value=1, step=1)
-    
+    with col2:
+        page_size = st.selectbox("Page Size", [50, 100, 250, 500], index=1, key="q1_page_size")
+
+    # Keyset cursors of the pages visited so far (None = first page); the
+    # last one is the page on screen. Changing the inputs starts over.
+    if st.session_state.get("q1_query") != (region_id, page_size):
+        st.session_state.q1_query = (region_id, page_size)
+        st.session_state.q1_pages = None
     if st.button("Fetch Earthquakes", key="q1"):
+        st.session_state.q1_pages = [None]
+
+    pages = st.session_state.q1_pages
+    if pages:
         try:
-            response = requests.get(f"{API_BASE_URL}/regions/{region_id}/earthquakes")
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
-                    display_success(f"Found {len(data)} earthquakes in region {region_id}")
+            # One extra row tells whether a next page exists
+            status, data = fetch_arrow(
+                f"/regions/{region_id}/earthquakes/arrow",
+                {"limit": page_size + 1, **(pages[-1] or {})}
+            )
+            if status == 200:
+                if data.num_rows:
+                    has_next = data.num_rows > page_size
+                    data = data.slice(0, page_size)
+                    st.dataframe(data, width="stretch")
+                    display_success(f"Showing {data.num_rows} earthquakes in region {region_id} (page {len(pages)})")
+                    last = data.slice(data.num_rows - 1).to_pylist()[0]
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.button("Previous Page", key="q1_prev", disabled=len(pages) == 1,
+                                  on_click=pages.pop)
+                    with col2:
+                        st.button("Next Page", key="q1_next", disabled=not has_next,
+                                  on_click=pages.append,
+                                  args=({"cursor_ms": last["time_ms"], "cursor_id": last["quake_id"]},))
                 else:
                     st.info("No earthquakes found for this region")
             else:
-                display_error(response.json().get("detail", "Failed to fetch data"))
+                display_error(data.get("detail", "Failed to fetch data"))
         except Exception as e:
             display_error(str(e))
 
@@ -123,15 +224,14 @@ elif query_type == "2. Average Magnitude":
     
     if st.button("Calculate Average", key="q2"):
         try:
-            response = requests.get(f"{API_BASE_URL}/regions/{region_id}/stats/avg-magnitude")
-            if response.status_code == 200:
-                data = response.json()
+            status, data = fetch_json(f"/regions/{region_id}/stats/avg-magnitude")
+            if status == 200:
                 col1, col2 = st.columns(2)
                 with col1:
                     st.metric("Average Magnitude", f"{data.get('avg_magnitude', 'N/A'):.2f}" if isinstance(data.get('avg_magnitude'), (int, float)) else "N/A")
                 display_success(f"Statistics calculated for region {region_id}")
             else:
-                display_error(response.json().get("detail", "Failed to fetch data"))
+                display_error(data.get("detail", "Failed to fetch data"))
         except Exception as e:
             display_error(str(e))
 
@@ -149,12 +249,8 @@ elif query_type == "3. Nearby Earthquakes":
     
     if st.button("Search Nearby", key="q3"):
         try:
-            response = requests.get(
-                f"{API_BASE_URL}/analytics/nearby",
-                params={"lat": latitude, "lon": longitude, "radius_km": radius}
-            )
-            if response.status_code == 200:
-                data = response.json()
+            status, data = fetch_json("/analytics/nearby", {"lat": latitude, "lon": longitude, "radius_km": radius})
+            if status == 200:
                 st.metric("Earthquakes Found", data.get("quake_count", 0))
                 display_success("Search completed")
             else:
@@ -172,12 +268,11 @@ elif query_type == "4. Most Active Regions":
     
     if st.button("Get Active Regions", key="q4"):
         try:
-            response = requests.get(f"{API_BASE_URL}/analytics/regions/most-active", params={"top_n": top_n})
-            if response.status_code == 200:
-                data = response.json()
+            status, data = fetch_json("/analytics/regions/most-active", {"top_n": top_n})
+            if status == 200:
                 if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
+                    df = records_frame(data)
+                    st.dataframe(df, width="stretch")
                     display_success(f"Retrieved top {top_n} active regions")
                 else:
                     st.info("No data available")
@@ -203,21 +298,19 @@ elif query_type == "5. High Magnitude Earthquakes":
     
     if st.button("Search Earthquakes", key="q5"):
         try:
-            response = requests.get(
-                f"{API_BASE_URL}/analytics/high-magnitude",
-                params={
+            status, data = fetch_arrow(
+                "/analytics/high-magnitude/arrow",
+                {
                     "min_magnitude": min_magnitude,
-                    "start_date": str(start_date),
-                    "end_date": str(end_date),
+                    "start_date": start_date.isoformat(),
+                    "end_date": end_date.isoformat(),
                     "limit": limit
                 }
             )
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
-                    display_success(f"Found {len(data)} earthquakes matching criteria")
+            if status == 200:
+                if data.num_rows:
+                    st.dataframe(data, width="stretch")
+                    display_success(f"Found {data.num_rows} earthquakes matching criteria")
                 else:
                     st.info("No earthquakes found matching criteria")
             else:
@@ -236,12 +329,11 @@ elif query_type == "6. Regions with Min Quakes":
     
     if st.button("Get Regions", key="q6"):
         try:
-            response = requests.get(f"{API_BASE_URL}/analytics/regions/with-min-quakes", params={"min_quakes": min_quakes})
-            if response.status_code == 200:
-                data = response.json()
+            status, data = fetch_json("/analytics/regions/with-min-quakes", {"min_quakes": min_quakes})
+            if status == 200:
                 if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
+                    df = records_frame(data)
+                    st.dataframe(df, width="stretch")
                     display_success(f"Found {len(data)} regions with at least {min_quakes} earthquakes")
                 else:
                     st.info("No regions found matching criteria")
@@ -256,12 +348,11 @@ elif query_type == "7. Above Average Activity":
     
     if st.button("Get Regions", key="q7"):
         try:
-            response = requests.get(f"{API_BASE_URL}/analytics/regions/above-average-activity")
-            if response.status_code == 200:
-                data = response.json()
+            status, data = fetch_json("/analytics/regions/above-average-activity")
+            if status == 200:
                 if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
+                    df = records_frame(data)
+                    st.dataframe(df, width="stretch")
                     display_success(f"Found {len(data)} regions with above-average activity")
                 else:
                     st.info("No regions found")
@@ -284,19 +375,17 @@ elif query_type == "8. Multi-Criteria Search":
     
     if st.button("Search", key="q8"):
         try:
-            response = requests.get(
-                f"{API_BASE_URL}/analytics/multi-criteria",
-                params={
+            status, data = fetch_ndjson(
+                "/analytics/multi-criteria/stream",
+                {
                     "min_magnitude": min_magnitude,
                     "min_risk_level": min_risk_level,
                     "min_population": min_population
                 }
             )
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
+            if status == 200:
+                if not data.empty:
+                    st.dataframe(data, width="stretch")
                     display_success(f"Found {len(data)} earthquakes matching criteria")
                 else:
                     st.info("No earthquakes found matching criteria")
@@ -315,15 +404,11 @@ elif query_type == "9. High Population Regions":
     
     if st.button("Get Data", key="q9"):
         try:
-            response = requests.get(
-                f"{API_BASE_URL}/analytics/high-population-regions",
-                params={"min_population": min_population}
-            )
-            if response.status_code == 200:
-                data = response.json()
+            status, data = fetch_json("/analytics/high-population-regions", {"min_population": min_population})
+            if status == 200:
                 if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
+                    df = records_frame(data)
+                    st.dataframe(df, width="stretch")
                     display_success(f"Retrieved data for {len(data)} high-population regions")
                 else:
                     st.info("No regions found")
@@ -342,10 +427,12 @@ elif query_type == "10. Region Risk Summary":
     
     if st.button("Get Risk Summary", key="q10"):
         try:
-            response = requests.get(f"{API_BASE_URL}/regions/{region_id}/risk-summary")
-            if response.status_code == 200:
-                data = response.json()
-                
+            # Summary and latest quakes come back from one request
+            status, data = fetch_json(f"/regions/{region_id}/full")
+            if status == 200:
+                recent_quakes = data["recent_quakes"]
+                data = data["summary"]
+
                 # Display summary in columns
                 col1, col2, col3 = st.columns(3)
                 with col1:
@@ -359,9 +446,12 @@ elif query_type == "10. Region Risk Summary":
                 
                 # Display full data
                 st.json(data)
+                if recent_quakes:
+                    st.subheader("Most Recent Earthquakes")
+                    st.dataframe(records_frame(recent_quakes), width="stretch")
                 display_success("Risk summary retrieved")
             else:
-                display_error(response.json().get("detail", "Failed to fetch data"))
+                display_error(data.get("detail", "Failed to fetch data"))
         except Exception as e:
             display_error(str(e))
 
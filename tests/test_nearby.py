@@ -0,0 +1,56 @@
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from backend import queries
+from backend.database import SPATIAL_INDEX_DDL
+from backend.models import Earthquake, Region, SeismicZone
+
+
+@pytest.fixture
+def quake_db(tmp_path, monkeypatch):
+    """Point the queries at a fresh file holding one quake just east of the dateline."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for statement in SPATIAL_INDEX_DDL:
+            conn.exec_driver_sql(statement)
+        conn.execute(Region.__table__.insert(), [
+            {"region_id": 6, "region_name": "New Zealand and SW Pacific", "country": "NZ", "population": 5_000_000},
+        ])
+        conn.execute(SeismicZone.__table__.insert(), [
+            {"zone_id": 1, "zone_name": "Tonga-Kermadec", "risk_level": 5},
+        ])
+        conn.execute(Earthquake.__table__.insert(), [
+            {"datetime": "2025-01-01 00:00:00", "time_ms": 1735689600000, "magnitude": 5.0,
+             "depth_km": 10.0, "latitude": -27.5, "longitude": -176.15, "place": "Kermadec Islands",
+             "region_id": 6, "zone_id": 1},
+        ])
+    monkeypatch.setattr(queries, "engine", engine)
+    return engine
+
+
+def count_near(lat, lon, radius_km):
+    return queries.count_quakes_near_location(lat, lon, *queries.radius_to_deltas(lat, radius_km))
+
+
+def test_box_across_the_dateline_finds_quake_on_the_other_side(quake_db):
+    assert count_near(-27.5, 179.9, 500) == {"quake_count": 1}
+    assert count_near(-27.5, -179.9, 500) == {"quake_count": 1}
+
+
+def test_box_not_reaching_the_quake_finds_nothing(quake_db):
+    assert count_near(-27.5, 179.9, 50) == {"quake_count": 0}
+
+
+def test_polar_box_spans_every_longitude(quake_db):
+    assert count_near(-89.9, 100.0, 7000) == {"quake_count": 1}
+
+
+@pytest.mark.parametrize("lon_center, lon_delta, expected", [
+    (0.0, 10.0, ((-10.0, 10.0), queries.EMPTY_LON_RANGE)),
+    (175.0, 10.0, ((165.0, 180.0), (-180.0, -175.0))),
+    (-175.0, 10.0, ((-180.0, -165.0), (175.0, 180.0))),
+    (100.0, 180.0, ((-180.0, 180.0), queries.EMPTY_LON_RANGE)),
+])
+def test_longitude_ranges(lon_center, lon_delta, expected):
+    assert queries.longitude_ranges(lon_center, lon_delta) == expected